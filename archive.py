@@ -0,0 +1,334 @@
+# archive.py
+"""
+hot/cold archival for conversations.
+
+app.db only ever grows, and everything the agent does with run_sql over
+messages gets slower with it. this module moves the messages of idle
+conversations into a separate archive.db, one zlib-compressed json blob per
+conversation, and brings them back when the conversation gets a new message.
+
+the conversation row itself stays in app.db (it's tiny, keeps its id taken,
+and the api_key lives there). "archived" means: a row in
+archive.archived_conversations, normally with no messages left in app.db.
+archiving the same conversation again merges into that row, it never
+replaces it, and rehydration merges it with whatever is still in app.db.
+
+usage:
+    python archive.py                 # archive conversations idle > 30 days
+    python archive.py --idle-days 7
+"""
+import argparse
+import json
+import os
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import Session
+
+import models
+from database import ARCHIVE_DATABASE_PATH
+
+DEFAULT_IDLE_DAYS = 30
+# conversations moved per archive/app.db commit pair
+DEFAULT_BATCH_SIZE = 100
+
+# read-write handle, only used by the archival job and after a rehydration
+archive_engine = create_engine(f"sqlite:///{ARCHIVE_DATABASE_PATH}")
+
+ARCHIVE_DDL = """
+CREATE TABLE IF NOT EXISTS archived_conversations (
+    id INTEGER PRIMARY KEY,          -- same id as conversations.id in app.db
+    last_activity_at TEXT NOT NULL,
+    archived_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL,
+    payload BLOB NOT NULL            -- zlib(json([{role, text, created_at}, ...]))
+)
+"""
+
+
+def ensure_archive():
+    """create archive.db and its table if they don't exist yet."""
+    with archive_engine.begin() as conn:
+        conn.execute(text(ARCHIVE_DDL))
+
+
+@contextmanager
+def attached_archive(db: Session):
+    """
+    attach archive.db read-only to the session's connection as `archive`.
+
+    inside the block you can query e.g. archive.archived_conversations with
+    plain sql. sqlite refuses to DETACH while a transaction or cursor is open
+    on it, so fetch what you need and leave the block before writing.
+    """
+    uri = Path(ARCHIVE_DATABASE_PATH).resolve().as_uri() + "?mode=ro"
+    db.execute(text("ATTACH DATABASE :uri AS archive"), {"uri": uri})
+    try:
+        yield
+    finally:
+        db.execute(text("DETACH DATABASE archive"))
+
+
+def message_dicts(messages) -> list[dict]:
+    return [
+        {
+            "role": m.role,
+            "text": m.text,
+            "created_at": m.created_at.isoformat(),
+        }
+        for m in messages
+    ]
+
+
+def pack_messages(messages: list[dict]) -> bytes:
+    return zlib.compress(json.dumps(messages).encode("utf-8"), 9)
+
+
+def unpack_messages(blob: bytes) -> list[dict]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def message_key(m: dict) -> tuple:
+    return (m["created_at"], m["role"], m["text"])
+
+
+def merge_messages(archived: list[dict], new: list[dict]) -> list[dict]:
+    """
+    combine an existing archive payload with newly archived messages.
+
+    a conversation can be archived more than once (a message slipped in right
+    after it was archived, without rehydrating it), so the archive row must
+    grow rather than be replaced. exact repeats (same role, text and
+    timestamp) are dropped: they come from a run that wrote the archive but
+    crashed before deleting from app.db.
+    """
+    merged = []
+    seen = set()
+    for m in archived + new:
+        key = message_key(m)
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(m)
+    # stable: same-second messages keep their original order
+    merged.sort(key=lambda m: m["created_at"])
+    return merged
+
+
+def archive_idle_conversations(
+    db: Session,
+    idle_days: int = DEFAULT_IDLE_DAYS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict:
+    """
+    move messages of conversations idle for more than `idle_days` to archive.db.
+
+    per batch, the messages are deleted from app.db first (uncommitted), then
+    written to the archive, then the delete is committed. a crash in between
+    leaves them in both places; the next run merges the duplicates away.
+
+    returns counts of archived conversations and messages.
+    """
+    ensure_archive()
+
+    # sqlite's CURRENT_TIMESTAMP (our server_default) is naive utc
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(days=idle_days)
+
+    last_activity = func.max(models.Message.created_at)
+    idle = (
+        db.query(models.Message.conversation_id, last_activity)
+        .group_by(models.Message.conversation_id)
+        .having(last_activity < cutoff)
+        .order_by(models.Message.conversation_id)
+        .all()
+    )
+
+    archived_conversations = 0
+    archived_messages = 0
+
+    for start in range(0, len(idle), batch_size):
+        records = []
+        for conversation_id, last_activity_at in idle[start : start + batch_size]:
+            messages = (
+                db.query(models.Message)
+                .filter_by(conversation_id=conversation_id)
+                .order_by(models.Message.created_at, models.Message.id)
+                .all()
+            )
+            max_message_id = max(m.id for m in messages)
+            new_messages = message_dicts(messages)
+
+            # only delete if nothing new arrived since we read the messages;
+            # otherwise the conversation is hot again and stays in app.db
+            deleted = db.execute(
+                text(
+                    "DELETE FROM messages WHERE conversation_id = :id "
+                    "AND (SELECT max(id) FROM messages WHERE conversation_id = :id) "
+                    "= :max_message_id"
+                ),
+                {"id": conversation_id, "max_message_id": max_message_id},
+            ).rowcount
+            if not deleted:
+                continue
+
+            records.append(
+                {
+                    "id": conversation_id,
+                    "last_activity_at": last_activity_at.isoformat(),
+                    "archived_at": now.isoformat(),
+                    "messages": new_messages,
+                }
+            )
+            archived_conversations += 1
+            archived_messages += deleted
+
+        if not records:
+            db.rollback()
+            continue
+
+        with archive_engine.begin() as conn:
+            for record in records:
+                existing = conn.execute(
+                    text("SELECT payload FROM archived_conversations WHERE id = :id"),
+                    {"id": record["id"]},
+                ).first()
+                messages = record.pop("messages")
+                if existing is not None:
+                    messages = merge_messages(unpack_messages(existing.payload), messages)
+                record["message_count"] = len(messages)
+                record["payload"] = pack_messages(messages)
+
+            conn.execute(
+                text(
+                    "INSERT OR REPLACE INTO archived_conversations "
+                    "(id, last_activity_at, archived_at, message_count, payload) "
+                    "VALUES (:id, :last_activity_at, :archived_at, :message_count, :payload)"
+                ),
+                records,
+            )
+
+        # only now that the archive is committed, make the delete stick
+        db.commit()
+
+    return {
+        "conversations": archived_conversations,
+        "messages": archived_messages,
+    }
+
+
+def rehydrate_conversation(db: Session, conversation_id: int) -> int:
+    """
+    move an archived conversation's messages back into app.db.
+
+    a conversation is archived iff archive.archived_conversations has a row
+    for it. usually it then has no messages in app.db, but one can slip in
+    right after archival; those are merged with the archived history rather
+    than hiding it. no-op (no archive lookup at all) if archive.db doesn't
+    exist. commits the session when something was restored.
+
+    returns the number of restored messages.
+    """
+    if not os.path.exists(ARCHIVE_DATABASE_PATH):
+        return 0
+
+    with attached_archive(db):
+        row = db.execute(
+            text("SELECT payload FROM archive.archived_conversations WHERE id = :id"),
+            {"id": conversation_id},
+        ).first()
+    if row is None:
+        return 0
+
+    hot_messages = message_dicts(
+        db.query(models.Message).filter_by(conversation_id=conversation_id).all()
+    )
+    hot_keys = {message_key(m) for m in hot_messages}
+    merged = merge_messages(unpack_messages(row.payload), hot_messages)
+
+    # new ids (old ones may have been reused meanwhile), original timestamps;
+    # ordering is by created_at, so restored history sorts before hot messages
+    messages = [m for m in merged if message_key(m) not in hot_keys]
+    db.add_all(
+        models.Message(
+            conversation_id=conversation_id,
+            role=m["role"],
+            text=m["text"],
+            created_at=datetime.fromisoformat(m["created_at"]),
+        )
+        for m in messages
+    )
+    db.commit()
+
+    # only forget the cold copy once the hot one is safely committed
+    with archive_engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM archived_conversations WHERE id = :id"),
+            {"id": conversation_id},
+        )
+    return len(messages)
+
+
+def vacuum(engine):
+    """rebuild the sqlite file so deleted pages are actually returned to the os."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+
+
+def format_size(num_bytes: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GiB"
+
+
+if __name__ == "__main__":
+    from database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="archive idle conversations")
+    parser.add_argument(
+        "--idle-days",
+        type=int,
+        default=DEFAULT_IDLE_DAYS,
+        help=f"archive conversations with no message for this many days (default {DEFAULT_IDLE_DAYS})",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"conversations per commit (default {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--no-vacuum",
+        action="store_true",
+        help="skip VACUUM of app.db (space is reused, but the file won't shrink)",
+    )
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    app_db_path = engine.url.database
+    size_before = os.path.getsize(app_db_path)
+
+    db = SessionLocal()
+    try:
+        stats = archive_idle_conversations(db, args.idle_days, args.batch_size)
+    finally:
+        db.close()
+
+    if not args.no_vacuum:
+        vacuum(engine)
+    size_after = os.path.getsize(app_db_path)
+
+    print(
+        f"archived {stats['conversations']} conversations "
+        f"({stats['messages']} messages) idle > {args.idle_days} days"
+    )
+    print(
+        f"app.db: {format_size(size_before)} -> {format_size(size_after)} "
+        f"(reclaimed {format_size(size_before - size_after)})"
+    )
+    print(f"archive.db: {format_size(os.path.getsize(ARCHIVE_DATABASE_PATH))}")
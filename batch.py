@@ -0,0 +1,292 @@
+# batch.py
+"""
+batch / offline mode: run many prompts through the same safety + tool-using
+agent pipeline as the chat stream (main.run_agent), without touching the
+conversations/messages tables.
+
+input is jsonl, one prompt per line. the prompt is read from "prompt",
+"text" or "body", the id from "id" or "request_id" (line number otherwise),
+so a requests.jsonl-style file works as-is.
+
+output is jsonl too, one result per line, written as soon as an item
+finishes. the output file doubles as the checkpoint: with --resume, items
+that already have an "ok" or "blocked" result are skipped and failed ones are
+retried (the last line for an id wins).
+
+usage:
+    python batch.py prompts.jsonl results.jsonl
+    python batch.py prompts.jsonl results.jsonl --concurrency 8 --resume
+
+against a local openai-compatible server:
+    OPENAI_BASE_URL=http://localhost:8080/v1 CHAT_MODEL=my-model \\
+        python batch.py prompts.jsonl results.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import OpenAI
+
+from database import SessionLocal
+from main import run_agent
+
+DEFAULT_CONCURRENCY = 4
+
+PROMPT_KEYS = ("prompt", "text", "body")
+ID_KEYS = ("id", "request_id")
+
+
+def positive_int(value: str) -> int:
+    """argparse type for --concurrency."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def read_items(path: str) -> list[dict]:
+    """
+    parse a jsonl file of prompts into [{"id": str, "prompt": str}, ...].
+    blank lines are skipped; lines without a usable prompt are an error, and
+    so are duplicate ids (the checkpoint is keyed by id).
+    """
+    items = []
+    first_seen = {}
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            prompt = next((data[k] for k in PROMPT_KEYS if data.get(k)), None)
+            if not isinstance(prompt, str):
+                raise ValueError(f"{path}:{lineno}: no prompt ({', '.join(PROMPT_KEYS)})")
+            item_id = next((data[k] for k in ID_KEYS if data.get(k) is not None), lineno)
+            item_id = str(item_id)
+            if item_id in first_seen:
+                raise ValueError(
+                    f"{path}:{lineno}: duplicate id {item_id!r} "
+                    f"(first on line {first_seen[item_id]})"
+                )
+            first_seen[item_id] = lineno
+            items.append({"id": item_id, "prompt": prompt})
+    return items
+
+
+def truncate_torn_line(path: str):
+    """
+    cut off a last line that was only partly written when the run was
+    interrupted, so appended results start on a line of their own.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_checkpoint(path: str) -> set[str]:
+    """ids that already have a final (non-error) result in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # garbage line (truncate_torn_line already dropped a torn
+                # last line); whatever item it was just runs again
+                continue
+            if result.get("status") == "error":
+                done.discard(result.get("id"))
+            else:
+                done.add(result.get("id"))
+    return done
+
+
+def run_item(
+    client: OpenAI,
+    item: dict,
+    safety_cache: dict | None = None,
+    tool_cache: dict | None = None,
+) -> dict:
+    """
+    run one prompt through run_agent and collect everything it yields.
+
+    each item gets its own db session (items run on worker threads) and a
+    fresh single-turn history.
+    """
+    result = {
+        "id": item["id"],
+        "prompt": item["prompt"],
+        "status": "ok",
+        "answer": "",
+        "error": None,
+        "safety": None,
+        "tools": [],
+        "timings": {},
+    }
+    history = [{"role": "user", "content": item["prompt"]}]
+
+    started = time.perf_counter()
+    safety_done = started
+    db = SessionLocal()
+    try:
+        for kind, payload in run_agent(
+            client, db, history, item["prompt"], safety_cache, tool_cache
+        ):
+            if kind == "safety":
+                result["safety"] = payload
+                safety_done = time.perf_counter()
+            elif kind == "tool":
+                result["tools"].append(payload)
+                # hand the pooled connection back while we wait on the model;
+                # otherwise more workers than pool slots starve each other
+                db.close()
+            elif kind == "blocked":
+                result["status"] = "blocked"
+                result["answer"] = payload
+            elif kind == "error":
+                result["status"] = "error"
+                result["error"] = payload
+            else:
+                result["answer"] = payload
+    except Exception as e:
+        # run_agent handles model/tool errors itself; this is anything around it
+        print(traceback.format_exc(), file=sys.stderr)
+        result["status"] = "error"
+        result["error"] = f"[batch error: {e}]"
+    finally:
+        db.close()
+
+    finished = time.perf_counter()
+    result["timings"] = {
+        "safety_s": round(safety_done - started, 4),
+        "agent_s": round(finished - safety_done, 4),
+        "total_s": round(finished - started, 4),
+    }
+    return result
+
+
+def run_batch(
+    client: OpenAI,
+    items: list[dict],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_result=None,
+) -> list[dict]:
+    """
+    run items with at most `concurrency` in flight, return results in the
+    same order as `items`.
+
+    safety verdicts and tool results are cached across the whole batch:
+    canned eval sets repeat prompts and the agent repeats the same catalog
+    queries, and neither changes during a run. `on_result` is called on the
+    calling thread as each item finishes (used to write the checkpoint).
+
+    on ctrl-c, queued items are dropped, but items already in flight are
+    waited for and still passed to `on_result` before the interrupt is
+    re-raised: that's paid model work a --resume shouldn't redo.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    safety_cache = {}
+    tool_cache = {}
+    results = [None] * len(items)
+
+    def record(future):
+        result = future.result()
+        results[futures[future]] = result
+        if on_result is not None:
+            on_result(result)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    futures = {}
+    try:
+        for i, item in enumerate(items):
+            futures[pool.submit(run_item, client, item, safety_cache, tool_cache)] = i
+        for future in as_completed(futures):
+            record(future)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for future, i in futures.items():
+            if results[i] is None and future.done() and not future.cancelled():
+                record(future)
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run prompts through the agent in batch")
+    parser.add_argument("input", help="jsonl file with one prompt per line")
+    parser.add_argument("output", help="jsonl file to write results to")
+    parser.add_argument(
+        "--concurrency",
+        type=positive_int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"prompts in flight at once (default {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip items already finished in the output file instead of overwriting it",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=os.getenv("OPENAI_BASE_URL"),
+        help="openai-compatible api base url (default: OPENAI_BASE_URL or api.openai.com)",
+    )
+    args = parser.parse_args()
+
+    # local stand-ins usually don't check the key, but the client insists on one
+    api_key = os.getenv("OPENAI_API_KEY") or ("local" if args.base_url else None)
+    if not api_key:
+        sys.exit("no api key configured. set OPENAI_API_KEY (or --base-url for a local server).")
+    client = OpenAI(api_key=api_key, base_url=args.base_url)
+
+    items = read_items(args.input)
+    if args.resume:
+        truncate_torn_line(args.output)
+        done = load_checkpoint(args.output)
+        todo = [item for item in items if item["id"] not in done]
+    else:
+        todo = items
+    print(f"{len(todo)} of {len(items)} items to run", file=sys.stderr)
+
+    counts = {"ok": 0, "blocked": 0, "error": 0}
+    started = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as out:
+
+        def write_result(result):
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            finished = sum(counts.values())
+            print(
+                f"[{finished}/{len(todo)}] {result['id']}: {result['status']} "
+                f"({result['timings']['total_s']:.2f}s)",
+                file=sys.stderr,
+            )
+
+        try:
+            run_batch(client, todo, concurrency=args.concurrency, on_result=write_result)
+        except KeyboardInterrupt:
+            sys.exit(
+                f"interrupted after {sum(counts.values())} of {len(todo)} items; "
+                "rerun with --resume to continue"
+            )
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"done in {elapsed:.1f}s: {counts['ok']} ok, "
+        f"{counts['blocked']} blocked, {counts['error']} error",
+        file=sys.stderr,
+    )
@@ -4,6 +4,9 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 
+# cold storage for idle conversations, see archive.py
+ARCHIVE_DATABASE_PATH = "./archive.db"
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},  # sqlite + threads 🤝 pain
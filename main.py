@@ -21,11 +21,20 @@ import schemas
 # SYSTEM_PROMPT: main agent behavior, including how to use sql tools
 # SAFETY_SYSTEM_PROMPT: separate prompt just for the security pre-check
 from prompts import SAFETY_SYSTEM_PROMPT, SYSTEM_PROMPT
-from tools import SQL_TOOL_SPEC
+from tools import SQL_TOOL_SPEC, SEARCH_TOOL_SPEC
+from search import DEFAULT_SEARCH_LIMIT, ensure_product_search, search_products
+from archive import rehydrate_conversation
 
 
+# models for the main agent and the safety pre-check; override these to point
+# at a local openai-compatible server (together with OPENAI_BASE_URL)
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-5-mini")
+SAFETY_MODEL = os.getenv("SAFETY_MODEL", CHAT_MODEL)
+
 # create db schema if it doesn't exist yet
 Base.metadata.create_all(bind=engine)
+# fts index over products (+ triggers keeping it in sync); see search.py
+ensure_product_search(engine)
 
 # fastapi app instance
 app = FastAPI()
@@ -119,6 +128,24 @@ def run_readonly_sql(db: Session, query: str):
     return rows
 
 
+def run_tool(db: Session, name: str, args: dict):
+    """
+    dispatch a tool call from the model to the matching python function.
+
+    returns the rows the tool produced; raises on unknown tools or bad input
+    so the caller can hand the error back to the model.
+    """
+    if name == "run_sql":
+        return run_readonly_sql(db, args.get("query", ""))
+    if name == "search_products":
+        return search_products(
+            db,
+            args.get("query", ""),
+            args.get("limit", DEFAULT_SEARCH_LIMIT),
+        )
+    raise ValueError(f"unknown tool: {name}")
+
+
 def run_safety_check(client: OpenAI, user_text: str) -> dict:
     """
     run a dedicated safety / security check on the latest user message.
@@ -130,12 +157,11 @@ def run_safety_check(client: OpenAI, user_text: str) -> dict:
     - if anything fails, log traceback and return a "safe: true, error" object
       (fail-open, but indicate that the safety layer had issues)
 
-    this function is *defined* here but wired into the stream handler below
-    (currently commented out for demo purposes).
+    wired into run_agent below, which both the stream and batch mode use.
     """
     try:
         resp = client.chat.completions.create(
-            model="gpt-5-mini",  # or any model you want to use for safety
+            model=SAFETY_MODEL,
             response_format={"type": "json_object"},
             messages=[
                 {"role": "system", "content": SAFETY_SYSTEM_PROMPT},
@@ -198,6 +224,7 @@ def add_user_message(
 
     behavior:
     - look up conversation by id
+    - if it was archived (see archive.py), move its messages back into app.db
     - if payload includes a "key", store it on the conversation as api_key
       (this is intentionally insecure in a real-world sense, for demo purposes)
     - store the user message text in the Message table
@@ -206,6 +233,9 @@ def add_user_message(
     if not conv:
         raise HTTPException(status_code=404, detail="conversation not found")
 
+    # bring back archived history before appending, so the agent sees it
+    rehydrate_conversation(db, conversation_id)
+
     # stash api key on the conversation for later use by the streaming endpoint
     if getattr(payload, "key", None):
         conv.api_key = payload.key
@@ -223,6 +253,159 @@ def add_user_message(
     return JSONResponse({"status": "ok"})
 
 
+def run_agent(
+    client: OpenAI,
+    db: Session,
+    history: list[dict],
+    user_text: str,
+    safety_cache: dict | None = None,
+    tool_cache: dict | None = None,
+):
+    """
+    the safety check + tool-using agent loop, as a plain (sync) generator.
+
+    shared by the sse stream below and by batch mode (batch.py / POST /batch),
+    so both go through exactly the same pipeline. yields (kind, payload) pairs:
+      - ("safety", dict)   verdict of run_safety_check
+      - ("tool", dict)     one log entry per tool call (query + result)
+      - ("blocked", str)   final text when the safety filter said no
+      - ("answer", str)    final assistant text
+      - ("error", str)     final text when something blew up in the loop
+
+    history is the prior user/assistant turns as openai-style messages
+    ({"role", "content"}), ending with the latest user message.
+
+    the optional caches are plain dicts shared between calls (batch mode):
+    safety verdicts are keyed by user text, tool results by tool name + args.
+    only successful results are cached.
+    """
+    # ------------------------------------------------------------------
+    # SAFETY LAYER
+    #   1) run_safety_check() on the last user message
+    #   2) emit the verdict so the caller can show/log it
+    #   3) if safe == false, bail *before* invoking the main model or any tools.
+    # ------------------------------------------------------------------
+    if safety_cache is not None and user_text in safety_cache:
+        safety = safety_cache[user_text]
+    else:
+        safety = run_safety_check(client, user_text)
+        if safety_cache is not None and safety.get("category") != "error":
+            safety_cache[user_text] = safety
+
+    yield "safety", safety
+
+    if not safety.get("safe", True):
+        yield "blocked", (
+            "this request was blocked by the security filter.\n\n"
+            f"reason: {safety.get('reason', '')}\n"
+            f"category: {safety.get('category', 'unknown')}"
+        )
+        return
+
+    # ------------------------------------------------------------------
+    # MAIN TOOL-USING ASSISTANT FLOW
+    # ------------------------------------------------------------------
+
+    # build chat history with system prompt + all prior user/assistant turns
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+        },
+    ]
+    messages.extend(history)
+
+    try:
+        # allow a limited number of tool iterations (e.g. 4) to avoid infinite loops
+        for _ in range(4):
+            resp = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                tools=[SQL_TOOL_SPEC, SEARCH_TOOL_SPEC],
+                tool_choice="auto",  # model decides if/when to call the tool
+            )
+            choice = resp.choices[0]
+            msg = choice.message
+
+            # tool_calls is where the model specifies sql queries via the tool schema
+            tool_calls = getattr(msg, "tool_calls", None)
+            if tool_calls:
+                for tc in tool_calls:
+                    name = tc.function.name
+                    args_str = tc.function.arguments or "{}"
+                    try:
+                        args = json.loads(args_str)
+                    except json.JSONDecodeError:
+                        # if arguments are garbage, we treat as empty
+                        args = {}
+                    query = args.get("query", "")
+
+                    cache_key = (name, json.dumps(args, sort_keys=True))
+                    result_payload: dict | list
+                    if tool_cache is not None and cache_key in tool_cache:
+                        result_payload = tool_cache[cache_key]
+                    else:
+                        try:
+                            # run the tool (read-only sql or product search) and capture rows
+                            rows = run_tool(db, name, args)
+                            result_payload = {"ok": True, "rows": rows}
+                            if tool_cache is not None:
+                                tool_cache[cache_key] = result_payload
+                        except Exception as e:
+                            # if the tool fails, capture the error so the model can react
+                            result_payload = {"ok": False, "error": str(e)}
+
+                    log_entry = {
+                        "type": "tool_call",
+                        "tool_name": name,
+                        "query": query,
+                        "result": result_payload,
+                    }
+                    yield "tool", log_entry
+
+                    # feed the tool call + result back into the conversation
+                    # so the model can generate a final answer that uses it
+                    messages.append(
+                        {
+                            "role": "assistant",
+                            "content": msg.content or "",
+                            "tool_calls": [
+                                {
+                                    "id": tc.id,
+                                    "type": "function",
+                                    "function": {
+                                        "name": name,
+                                        "arguments": args_str,
+                                    },
+                                }
+                            ],
+                        }
+                    )
+                    messages.append(
+                        {
+                            "role": "tool",
+                            "tool_call_id": tc.id,
+                            "name": name,
+                            "content": json.dumps(result_payload),
+                        }
+                    )
+
+                # after handling tool calls, go back to the top of the loop
+                # and let the model see the tool responses
+                continue
+
+            # if we get here, there were no tool calls: msg.content is the final answer
+            yield "answer", msg.content or ""
+            return
+
+        # ran out of tool iterations without a final answer
+        yield "answer", ""
+
+    except Exception as e:
+        # any unexpected backend error becomes the assistant text
+        yield "error", f"[backend error: {e}]"
+
+
 @app.get("/conversations/{conversation_id}/stream")
 async def stream_assistant(
     conversation_id: int,
@@ -236,15 +419,12 @@ async def stream_assistant(
     - uses either:
         - the per-conversation api_key (if user provided one), or
         - the OPENAI_API_KEY from the environment
-    - (optionally) runs a safety check on the latest user message
-    - runs the main tool-using agent loop with sql access
+    - runs the safety check + tool-using agent loop (see run_agent)
     - streams out:
+        - "safety" event with the safety verdict
         - "token" events for assistant text, 1 char at a time
         - "tool" events when tools are called (including query + result)
         - "done" event at the end
-
-    note: the safety section is temporarily commented out so you can demo
-    the unsafe behavior first, then enable the filter live.
     """
     conv = db.query(models.Conversation).filter_by(id=conversation_id).first()
     if not conv:
@@ -283,195 +463,40 @@ async def stream_assistant(
                 # send one character per event so the frontend shows incremental typing
                 yield {"event": "token", "data": ch}
                 await asyncio.sleep(0)
-            # signal completion
-            yield {"event": "done", "data": "[DONE]"}
-            # store this "assistant" response in the db
-            assistant_msg = models.Message(
-                conversation_id=conversation_id,
-                role="assistant",
-                text=accumulated,
-            )
-            db.add(assistant_msg)
-            db.commit()
-            return
-
-        # create openai client with the chosen key
-        client = OpenAI(api_key=api_key)
-
-        # ------------------------------------------------------------------
-        # OPTIONAL SAFETY LAYER (currently disabled for demo purposes)
-        #
-        # if you want to enable the llm-based firewall, uncomment this block.
-        # workflow:
-        #   1) run_safety_check() on the last user message
-        #   2) emit a "safety" event so the frontend can show/log the verdict
-        #   3) if safe == false, stream a blocking message and bail *before*
-        #      invoking the main model or any tools.
-        # ------------------------------------------------------------------
-
-        safety = run_safety_check(client, last_user.text or "")
-
-        # stream safety decision as a separate event for the frontend to inspect/log
-        try:
-            yield {
-                "event": "safety",
-                "data": json.dumps(safety),
-            }
-            await asyncio.sleep(0)
-        except Exception:
-            # if sending the safety event via SSE fails, ignore it;
-            # the main flow still runs (fail-open on telemetry, not on functionality)
-            pass
-
-        if not safety.get("safe", True):
-            # if the safety filter flags this as unsafe, we *do not* call tools or main model
-            msg = (
-                "this request was blocked by the security filter.\n\n"
-                f"reason: {safety.get('reason', '')}\n"
-                f"category: {safety.get('category', 'unknown')}"
-            )
-            for ch in msg:
-                accumulated += ch
-                yield {"event": "token", "data": ch}
-                await asyncio.sleep(0)
-
-            # signal completion
-            yield {"event": "done", "data": "[DONE]"}
-
-            # persist the blocking message as an assistant response
-            assistant_msg = models.Message(
-                conversation_id=conversation_id,
-                role="assistant",
-                text=accumulated,
-            )
-            db.add(assistant_msg)
-            db.commit()
-            return
-
-        # ------------------------------------------------------------------
-        # MAIN TOOL-USING ASSISTANT FLOW
-        # ------------------------------------------------------------------
-
-        # build chat history with system prompt + all prior user/assistant turns
-        messages = [
-            {
-                "role": "system",
-                "content": SYSTEM_PROMPT,
-            },
-        ]
-        messages.extend(
-            {"role": m.role, "content": m.text}
-            for m in conv.messages
-            if m.role in ("user", "assistant")
-        )
-
-        # place to stash tool logs for debugging / observability (also streamed to frontend)
-        tool_logs = []
-
-        try:
-            # allow a limited number of tool iterations (e.g. 4) to avoid infinite loops
-            for _ in range(4):
-                resp = client.chat.completions.create(
-                    model="gpt-5-mini",
-                    messages=messages,
-                    tools=[SQL_TOOL_SPEC],
-                    tool_choice="auto",  # model decides if/when to call the tool
-                )
-                choice = resp.choices[0]
-                msg = choice.message
-
-                # tool_calls is where the model specifies sql queries via the tool schema
-                tool_calls = getattr(msg, "tool_calls", None)
-                if tool_calls:
-                    # model might also include natural language "reasoning" in msg.content
-                    if msg.content:
-                        tool_logs.append(
-                            {
-                                "type": "assistant_tool_thought",
-                                "content": msg.content,
-                            }
-                        )
-
-                    for tc in tool_calls:
-                        name = tc.function.name
-                        args_str = tc.function.arguments or "{}"
-                        try:
-                            args = json.loads(args_str)
-                        except json.JSONDecodeError:
-                            # if arguments are garbage, we treat as empty
-                            args = {}
-                        query = args.get("query", "")
-
-                        result_payload: dict | list
-                        try:
-                            # run the sql in read-only mode and capture rows
-                            rows = run_readonly_sql(db, query)
-                            result_payload = {"ok": True, "rows": rows}
-                        except Exception as e:
-                            # if sql fails, capture the error so the model can react
-                            result_payload = {"ok": False, "error": str(e)}
-
-                        log_entry = {
-                            "type": "tool_call",
-                            "tool_name": name,
-                            "query": query,
-                            "result": result_payload,
-                        }
-                        tool_logs.append(log_entry)
-
-                        # send tool log immediately to frontend so users can see
-                        # exactly what sql got executed and what came back
-                        yield {
-                            "event": "tool",
-                            "data": json.dumps(log_entry),
-                        }
+        else:
+            # create openai client with the chosen key
+            client = OpenAI(api_key=api_key)
+
+            history = [
+                {"role": m.role, "content": m.text}
+                for m in conv.messages
+                if m.role in ("user", "assistant")
+            ]
+
+            for kind, payload in run_agent(client, db, history, last_user.text or ""):
+                if kind == "safety":
+                    # stream safety decision as a separate event for the frontend to inspect/log
+                    try:
+                        yield {"event": "safety", "data": json.dumps(payload)}
                         await asyncio.sleep(0)
-
-                        # feed the tool call + result back into the conversation
-                        # so the model can generate a final answer that uses it
-                        messages.append(
-                            {
-                                "role": "assistant",
-                                "content": msg.content or "",
-                                "tool_calls": [
-                                    {
-                                        "id": tc.id,
-                                        "type": "function",
-                                        "function": {
-                                            "name": name,
-                                            "arguments": args_str,
-                                        },
-                                    }
-                                ],
-                            }
-                        )
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": tc.id,
-                                "name": name,
-                                "content": json.dumps(result_payload),
-                            }
-                        )
-
-                    # after handling tool calls, go back to the top of the loop
-                    # and let the model see the tool responses
-                    continue
-
-                # if we get here, there were no tool calls: msg.content is the final answer
-                final_text = msg.content or ""
-                # stream the final answer character-by-character
-                for ch in final_text:
-                    accumulated += ch
-                    yield {"event": "token", "data": ch}
+                    except Exception:
+                        # if sending the safety event via SSE fails, ignore it;
+                        # the main flow still runs (fail-open on telemetry, not on functionality)
+                        pass
+                elif kind == "tool":
+                    # send tool log immediately to frontend so users can see
+                    # exactly what sql got executed and what came back
+                    yield {"event": "tool", "data": json.dumps(payload)}
                     await asyncio.sleep(0)
-                break
-
-        except Exception as e:
-            # any unexpected backend error gets streamed as part of the assistant text
-            err = f"[backend error: {e}]"
-            accumulated += err
-            yield {"event": "token", "data": err}
+                elif kind == "error":
+                    accumulated += payload
+                    yield {"event": "token", "data": payload}
+                else:
+                    # blocked message or final answer, streamed character-by-character
+                    for ch in payload:
+                        accumulated += ch
+                        yield {"event": "token", "data": ch}
+                        await asyncio.sleep(0)
 
         # signal that streaming is done
         yield {"event": "done", "data": "[DONE]"}
@@ -487,3 +512,37 @@ async def stream_assistant(
 
     # wrap the async generator in an SSE response
     return EventSourceResponse(event_generator())
+
+
+@app.post("/batch", response_model=list[schemas.BatchResult])
+def run_batch_endpoint(payload: schemas.BatchCreate):
+    """
+    run a list of standalone prompts through the same pipeline as the stream.
+
+    nothing is written to conversations/messages. meant for small ad-hoc
+    batches (at most schemas.MAX_BATCH_ITEMS); for thousands of prompts use
+    the batch.py cli, which writes results as it goes and can resume after an
+    interruption.
+    """
+    # imported here: batch.py imports this module for run_agent
+    from batch import run_batch
+
+    api_key = payload.key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=400, detail="no api key configured")
+
+    items = [
+        {"id": item.id if item.id is not None else f"#{i}", "prompt": item.prompt}
+        for i, item in enumerate(payload.items)
+    ]
+    ids = [item["id"] for item in items]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise HTTPException(
+            status_code=400,
+            detail=f"duplicate item ids: {', '.join(duplicates)}",
+        )
+
+    client = OpenAI(api_key=api_key)
+    # results come back in request order
+    return run_batch(client, items, concurrency=payload.concurrency)
@@ -2,7 +2,7 @@
 from datetime import datetime
 from typing import Literal, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class MessageBase(BaseModel):
@@ -34,3 +34,30 @@ class ConversationRead(BaseModel):
 
     class Config:
         from_attributes = True  # orm_mode=True on pydantic v1
+
+
+class BatchItem(BaseModel):
+    # id is optional; missing ids become "#<position in the list>"
+    id: str | None = None
+    prompt: str
+
+
+# POST /batch blocks until every item is done; bigger jobs go through batch.py
+MAX_BATCH_ITEMS = 50
+
+
+class BatchCreate(BaseModel):
+    items: List[BatchItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+    key: str | None = None
+    concurrency: int = Field(default=4, ge=1, le=16)
+
+
+class BatchResult(BaseModel):
+    id: str
+    prompt: str
+    status: Literal["ok", "blocked", "error"]
+    answer: str
+    error: str | None = None
+    safety: dict | None = None
+    tools: List[dict] = []
+    timings: dict[str, float] = {}
@@ -0,0 +1,191 @@
+# search.py
+"""
+full-text search over products, backed by an sqlite FTS5 index.
+
+products_fts is an "external content" fts5 table: it stores only the index,
+the actual rows live in products. triggers on products keep the two in sync,
+so inserts/updates/deletes from the orm *and* raw sql are covered.
+
+run `python search.py` to rebuild the index from scratch (e.g. after a bulk
+import that bypassed sqlite, or if the index ever looks off).
+"""
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# how many hits search_products returns if the caller doesn't say
+DEFAULT_SEARCH_LIMIT = 10
+# hard cap so the model can't ask for the whole catalog in one tool call
+MAX_SEARCH_LIMIT = 25
+
+# name matches count more than description matches when ranking (bm25 weights)
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# words shorter than this are dropped from search queries
+MIN_TERM_LENGTH = 2
+# only the last word is prefix-matched ("waterpr" -> waterproof), and only if
+# it's at least this long; short prefixes match half the vocabulary.
+# keep in sync with PREFIX_INDEX below
+MIN_PREFIX_LENGTH = 3
+# fts5 prefix index size; shorter prefix queries are never built, longer ones
+# fall back to a term-range scan
+PREFIX_INDEX = "prefix='3'"
+
+# filler from natural-language questions ("do you sell anything waterproof?");
+# OR-ed in, these would match nearly every product
+STOP_WORDS = frozenset(
+    """
+    about all an and any anything are as at be buy by can do does for from get
+    have i in is it me my of on or our sell sells some something that the
+    there this to want we what which with you your
+    """.split()
+)
+
+FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name,
+        description,
+        content='products',
+        content_rowid='id',
+        tokenize='porter unicode61',
+        {PREFIX_INDEX}
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def ensure_product_search(engine: Engine):
+    """
+    create the fts table + sync triggers if they don't exist yet.
+
+    if the index is brand new (e.g. an older app.db that already has products,
+    or an index created with different prefix options), it gets (re)built
+    right away so search works without a manual rebuild.
+    """
+    with engine.begin() as conn:
+        existing_sql = conn.execute(
+            text(
+                "SELECT sql FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'products_fts'"
+            )
+        ).scalar()
+        if existing_sql is not None and PREFIX_INDEX not in existing_sql:
+            # index built with other (or no) prefix options: recreate it
+            conn.execute(text("DROP TABLE products_fts"))
+            existing_sql = None
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+        if existing_sql is None:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+
+def rebuild_product_search(engine: Engine):
+    """
+    drop whatever is in the index and re-read every row from products.
+    """
+    ensure_product_search(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('optimize')"))
+
+
+def build_match_expression(query: str) -> str:
+    """
+    turn free text from the model into a safe fts5 MATCH expression.
+
+    fts5 has its own query syntax (quotes, NEAR, column filters, ...) and a
+    stray character is a syntax error, so we never pass the text through as-is.
+    instead each remaining word (minus stop words and very short ones) becomes
+    a quoted term, OR-ed together; bm25 then ranks rows matching more (and
+    rarer) words higher. only a long enough last word gets a prefix `*`.
+
+    returns "" if nothing searchable is left.
+    """
+    words = [
+        w
+        for w in re.findall(r"\w+", query.lower())
+        if len(w) >= MIN_TERM_LENGTH and w not in STOP_WORDS
+    ]
+    terms = [f'"{w}"' for w in words]
+    if words and len(words[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += "*"
+    return " OR ".join(terms)
+
+
+def search_products(db: Session, query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+    """
+    ranked full-text search over product names and descriptions.
+
+    returns at most MAX_SEARCH_LIMIT rows as dicts, best match first. each hit
+    carries a short snippet around the matched words instead of the whole
+    description, so tool payloads stay small even for long catalog entries.
+    """
+    match = build_match_expression(query or "")
+    if not match:
+        return []
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = DEFAULT_SEARCH_LIMIT
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    result = db.execute(
+        text(
+            """
+            SELECT
+                p.id,
+                p.name,
+                p.price,
+                snippet(products_fts, 1, '[', ']', '...', 16) AS snippet,
+                bm25(products_fts, :name_weight, :description_weight) AS score
+            FROM products_fts
+            JOIN products AS p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH :match
+            ORDER BY score
+            LIMIT :limit
+            """
+        ),
+        {
+            "match": match,
+            "limit": limit,
+            "name_weight": NAME_WEIGHT,
+            "description_weight": DESCRIPTION_WEIGHT,
+        },
+    )
+    return [dict(row._mapping) for row in result]
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+    import models  # noqa: F401  (registers tables on Base.metadata)
+
+    Base.metadata.create_all(bind=engine)
+    rebuild_product_search(engine)
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT count(*) FROM products_fts")).scalar()
+    print(f"rebuilt products_fts ({count} products indexed)")
@@ -23,3 +23,30 @@ SQL_TOOL_SPEC = {
         },
     },
 }
+
+SEARCH_TOOL_SPEC = {
+    "type": "function",
+    "function": {
+        "name": "search_products",
+        "description": (
+            "full-text search over product names and descriptions. "
+            "returns the best matching products first, with a short snippet. "
+            "prefer this over run_sql with LIKE for questions like "
+            "'do you sell anything waterproof?'."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "plain words to look for, e.g. 'waterproof jacket'.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "max number of hits to return (default 10, max 25).",
+                },
+            },
+            "required": ["query"],
+        },
+    },
+}